@@ -1,10 +1,48 @@
 import calendar
-from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import date, datetime
+import functools
 import random
+import re
 import csv
 import os
 
+try:
+    import ciso8601  # Optional: C parser for ISO dates
+    _parse_iso = ciso8601.parse_datetime
+except ImportError:
+    _parse_iso = None
+
+
+# Weekday names indexed by date.weekday() (Monday=0 ... Sunday=6)
+_WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Already-normalized date (YYYY-MM-DD)
+_ISO_RE = re.compile(r"^([0-9]{4})-([0-9]{2})-([0-9]{2})$")
+
+# Accepted input date formats, in priority order (ambiguous dates resolve to the first match)
+_DATE_FORMATS = (
+    "%m/%d/%Y",  # MM/DD/YYYY
+    "%d/%m/%Y",  # DD/MM/YYYY
+    "%Y/%m/%d",  # YYYY/MM/DD
+    "%m-%d-%Y",  # MM-DD-YYYY
+    "%d-%m-%Y",  # DD-MM-YYYY
+    "%Y-%m-%d",  # YYYY-MM-DD
+    "%m/%d/%y",  # MM/DD/YY
+    "%d/%m/%y",  # DD/MM/YY
+)
+
+
+def parse_iso_date(date_str):
+    """Parse a YYYY-MM-DD string into a date (raises ValueError if invalid)"""
+    match = _ISO_RE.match(date_str)
+    if not match:
+        raise ValueError(f"Not a YYYY-MM-DD date: {date_str}")
+
+    if _parse_iso is not None:
+        return _parse_iso(date_str).date()
+
+    return date(int(match[1]), int(match[2]), int(match[3]))
+
 
 def normalize_date_format(date_str):
     """Convert different date formats to unified YYYY-MM-DD format"""
@@ -12,36 +50,33 @@ def normalize_date_format(date_str):
         return ""
 
     date_str = date_str.strip()
+    normalized = _normalize_cached(date_str)
+    if normalized is None:
+        print(f"⚠️  Could not parse date: {date_str}")
+        return date_str  # Return original if parsing failed
 
-    # If already in correct format
-    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
-        try:
-            datetime.strptime(date_str, "%Y-%m-%d")
-            return date_str
-        except ValueError:
-            pass
+    return normalized
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_cached(date_str):
+    """Normalize a stripped date string, None if unparseable (cached, CSVs repeat the same dates)"""
+    # If already in correct format - validate without strptime
+    try:
+        parse_iso_date(date_str)
+        return date_str
+    except ValueError:
+        pass
 
     # Try different formats
-    formats_to_try = [
-        "%m/%d/%Y",  # MM/DD/YYYY
-        "%d/%m/%Y",  # DD/MM/YYYY
-        "%Y/%m/%d",  # YYYY/MM/DD
-        "%m-%d-%Y",  # MM-DD-YYYY
-        "%d-%m-%Y",  # DD-MM-YYYY
-        "%Y-%m-%d",  # YYYY-MM-DD
-        "%m/%d/%y",  # MM/DD/YY
-        "%d/%m/%y",  # DD/MM/YY
-    ]
-
-    for fmt in formats_to_try:
+    for fmt in _DATE_FORMATS:
         try:
             date_obj = datetime.strptime(date_str, fmt)
             return date_obj.strftime("%Y-%m-%d")
         except ValueError:
             continue
 
-    print(f"⚠️  Could not parse date: {date_str}")
-    return date_str  # Return original if parsing failed
+    return None
 
 
 def get_month_year():
@@ -61,29 +96,26 @@ def get_month_year():
 def save_configuration_csv(participants, participant_constraints, users_with_fewer_shifts, filename):
     """Save configuration to CSV file"""
     try:
-        with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
+        # Header
+        rows = [['name', 'weekday_blocks', 'date_blocks', 'fewer_shifts']]
 
-            # Header
-            writer.writerow(['name', 'weekday_blocks', 'date_blocks', 'fewer_shifts'])
+        # Data for each participant
+        for participant in participants:
+            weekday_blocks, date_blocks = participant_constraints[participant]
 
-            # Data for each participant
-            for participant in participants:
-                weekday_blocks, date_blocks = participant_constraints[participant]
+            # Convert lists to semicolon-separated strings
+            weekday_str = ';'.join(map(str, weekday_blocks)) if weekday_blocks else ''
 
-                # Convert lists to semicolon-separated strings
-                weekday_str = ';'.join(map(str, weekday_blocks)) if weekday_blocks else ''
+            # Save dates in protected format (with apostrophe at start to prevent auto-conversion)
+            date_str = ';'.join(f"'{blocked_date}" for blocked_date in date_blocks) if date_blocks else ''
 
-                # Save dates in protected format (with apostrophe at start to prevent auto-conversion)
-                if date_blocks:
-                    protected_dates = [f"'{date}" for date in date_blocks]
-                    date_str = ';'.join(protected_dates)
-                else:
-                    date_str = ''
+            fewer_shifts = 'YES' if participant in users_with_fewer_shifts else 'NO'
 
-                fewer_shifts = 'YES' if participant in users_with_fewer_shifts else 'NO'
+            rows.append([participant, weekday_str, date_str, fewer_shifts])
 
-                writer.writerow([participant, weekday_str, date_str, fewer_shifts])
+        # Write everything at once through a larger buffer
+        with open(filename, 'w', newline='', encoding='utf-8-sig', buffering=1 << 16) as f:
+            csv.writer(f).writerows(rows)
 
         print(f"✓ Configuration saved to file: {filename}")
         print("💡 Tip: If you open the file in Excel, dates are protected from auto-conversion")
@@ -119,6 +151,7 @@ def load_configuration_csv(filename):
                 # Parse date_blocks with different format handling
                 date_str = row['date_blocks'].strip()
                 date_blocks = []
+                seen_dates = set()  # Keeps dedup O(1) while date_blocks keeps file order
                 if date_str:
                     raw_dates = [x.strip() for x in date_str.split(';') if x.strip()]
                     for raw_date in raw_dates:
@@ -128,7 +161,8 @@ def load_configuration_csv(filename):
 
                         # Normalize the date
                         normalized_date = normalize_date_format(raw_date)
-                        if normalized_date and normalized_date not in date_blocks:
+                        if normalized_date and normalized_date not in seen_dates:
+                            seen_dates.add(normalized_date)
                             date_blocks.append(normalized_date)
 
                 participant_constraints[name] = (weekday_blocks, date_blocks)
@@ -157,7 +191,8 @@ def load_configuration_csv(filename):
 
 def list_config_files():
     """Display list of available configuration files"""
-    config_files = [f for f in os.listdir('.') if f.endswith('.csv')]
+    with os.scandir('.') as entries:
+        config_files = [e.name for e in entries if e.name.endswith('.csv') and e.is_file()]
     if config_files:
         print("\nAvailable configuration files:")
         for i, filename in enumerate(config_files, 1):
@@ -254,20 +289,14 @@ def get_date_range():
     end_date = get_date_input("End date")
 
     # Create list of dates in range
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+    start = datetime.strptime(start_date, "%Y-%m-%d").date().toordinal()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date().toordinal()
 
     if start > end:
         print("Start date must be before end date")
         return get_date_range()
 
-    dates = []
-    current = start
-    while current <= end:
-        dates.append(current.strftime("%Y-%m-%d"))
-        current += timedelta(days=1)
-
-    return dates
+    return [date.fromordinal(ordinal).isoformat() for ordinal in range(start, end + 1)]
 
 
 def get_participant_constraints(name):
@@ -370,20 +399,7 @@ def get_excluded_days(year, month):
     return excluded
 
 
-def get_week_number(date_str):
-    """Get week number of date"""
-    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-    return date_obj.isocalendar()[1]
-
-
-def is_consecutive_days(date1, date2):
-    """Check if two dates are consecutive days"""
-    d1 = datetime.strptime(date1, "%Y-%m-%d")
-    d2 = datetime.strptime(date2, "%Y-%m-%d")
-    return abs((d2 - d1).days) == 1
-
-
-def calculate_target_shifts(total_shifts, participants, users_with_fewer_shifts):
+def calculate_target_shifts(total_shifts, participants, users_with_fewer_shifts, rng=random):
     """Calculate target shifts for each participant according to new rules"""
     num_participants = len(participants)
     base_shifts = total_shifts // num_participants
@@ -406,7 +422,7 @@ def calculate_target_shifts(total_shifts, participants, users_with_fewer_shifts)
 
         # Then other participants randomly
         remaining_participants = [p for p in participants if p not in users_with_fewer_shifts]
-        random.shuffle(remaining_participants)
+        rng.shuffle(remaining_participants)
         reduction_candidates.extend(remaining_participants)
 
         # Reduce shift from first candidates
@@ -417,75 +433,95 @@ def calculate_target_shifts(total_shifts, participants, users_with_fewer_shifts)
     return target_shifts
 
 
-def analyze_day_constraints(day, participants, participant_constraints):
-    """Analyze constraints for specific day"""
-    date_obj = datetime.strptime(day, "%Y-%m-%d")
-    weekday = date_obj.weekday()
+def analyze_day_constraints(day, weekday, participants, weekday_blocked, date_sets):
+    """Analyze constraints for specific day using precomputed block sets"""
+    blocked_set = weekday_blocked[weekday] | {p for p in participants if day in date_sets[p]}
 
     blocked_users = []
     available_users = []
 
     for participant in participants:
-        weekday_blocks, date_blocks = participant_constraints[participant]
+        if participant not in blocked_set:
+            available_users.append(participant)
+            continue
 
-        is_blocked = False
         block_reasons = []
 
         # Check weekday constraint
-        if weekday in weekday_blocks:
-            is_blocked = True
-            weekday_names = {6: 'Sunday', 0: 'Monday', 1: 'Tuesday', 2: 'Wednesday', 3: 'Thursday'}
-            block_reasons.append(f"{weekday_names.get(weekday, weekday)}")
+        if participant in weekday_blocked[weekday]:
+            block_reasons.append(_WEEKDAY_NAMES[weekday])
 
         # Check specific date constraint
-        if day in date_blocks:
-            is_blocked = True
+        if day in date_sets[participant]:
             block_reasons.append("specific date")
 
-        if is_blocked:
-            blocked_users.append((participant, block_reasons))
-        else:
-            available_users.append(participant)
+        blocked_users.append((participant, block_reasons))
 
     return available_users, blocked_users
 
 
 def generate_shifts_constraint(year, month, participants, participant_constraints,
-                               users_with_fewer_shifts, excluded_days):
-    """Generate shift assignments with constraints"""
+                               users_with_fewer_shifts, excluded_days, seed=None):
+    """Generate shift assignments with constraints (pass seed for a reproducible schedule)"""
+    rng = random.Random(seed)
 
-    num_days = calendar.monthrange(year, month)[1]
-    valid_weekdays = [6, 0, 1, 2, 3]  # Sunday to Thursday
+    first_weekday, num_days = calendar.monthrange(year, month)
+    first_ordinal = date(year, month, 1).toordinal()
+    valid_weekdays = {6, 0, 1, 2, 3}  # Sunday to Thursday
+    excluded = set(excluded_days)
 
-    # Create list of valid shift days
+    # Create list of valid shift days and parse each one once:
+    # day -> (date, ISO week number, ordinal)
     shift_days = []
-    for d in range(1, num_days + 1):
-        date_str = f"{year}-{month:02d}-{d:02d}"
-        weekday = calendar.weekday(year, month, d)
+    day_info = {}
+    for offset in range(num_days):
+        if (first_weekday + offset) % 7 not in valid_weekdays:
+            continue
+
+        date_obj = date.fromordinal(first_ordinal + offset)
+        date_str = date_obj.isoformat()
+        if date_str in excluded:
+            continue
 
-        if weekday in valid_weekdays and date_str not in excluded_days:
-            shift_days.append(date_str)
+        shift_days.append(date_str)
+        day_info[date_str] = (date_obj, date_obj.isocalendar()[1], first_ordinal + offset)
 
     if not shift_days:
         print("No valid shift days in this month!")
-        return {}, {}, []
+        return {}, [], [], {}, []
 
     total_shifts = len(shift_days)
 
     # Calculate target shifts according to new rules
-    target_shifts = calculate_target_shifts(total_shifts, participants, users_with_fewer_shifts)
+    target_shifts = calculate_target_shifts(total_shifts, participants, users_with_fewer_shifts, rng)
+
+    # Index constraints once: blocked dates per participant, blocked participants per weekday
+    date_sets = {p: frozenset(date_blocks) for p, (_, date_blocks) in participant_constraints.items()}
+    weekday_blocked = {
+        wd: frozenset(p for p, (weekday_blocks, _) in participant_constraints.items() if wd in weekday_blocks)
+        for wd in range(7)
+    }
+
+    # One index per distinct name - hot state below is kept in lists indexed by it
+    names = list(dict.fromkeys(participants))
+    name_to_idx = {p: i for i, p in enumerate(names)}
 
     # Map constraints for each day
-    day_to_blocked_users = {}
+    day_to_blocked = {}
+    day_blocked_count = {}
     constraint_warnings = []
 
     for day in shift_days:
-        available_users, blocked_users = analyze_day_constraints(day, participants, participant_constraints)
-        day_to_blocked_users[day] = set(user for user, _ in blocked_users)
+        date_obj = day_info[day][0]
+        available_users, blocked_users = analyze_day_constraints(
+            day, date_obj.weekday(), participants, weekday_blocked, date_sets
+        )
+        day_to_blocked[day] = {name_to_idx[user] for user, _ in blocked_users}
+        day_blocked_count[day] = len(day_to_blocked[day])
 
         # Check if all participants are blocked
         if len(available_users) == 0:
-            day_name = datetime.strptime(day, "%Y-%m-%d").strftime("%A")
+            day_name = date_obj.strftime("%A")
 
             warning = f"⚠️  {day} ({day_name}): All participants are blocked!"
             for user, reasons in blocked_users:
@@ -493,103 +529,71 @@ def generate_shifts_constraint(year, month, participants, participant_constraint
             constraint_warnings.append(warning)
 
     # Sort days by constraint level (most constrained first)
-    sorted_shift_days = sorted(shift_days,
-                               key=lambda d: len(day_to_blocked_users[d]),
-                               reverse=True)
+    sorted_shift_days = sorted(shift_days, key=day_blocked_count.__getitem__, reverse=True)
 
     # Assign shifts
-    shifts = defaultdict(list)
-    assigned_count = defaultdict(int)
+    num_names = len(names)
+    target = [target_shifts[p] for p in names]
+    assigned = [0] * num_names
+    shifts_idx = [[] for _ in range(num_names)]
+    weeks_used = [set() for _ in range(num_names)]  # ISO weeks already assigned
+    ordinals_used = [set() for _ in range(num_names)]  # day ordinals already assigned
+    unassigned = []
+    assignments_in_order = []  # (ordinal, day, participant index) in assignment order
 
     for day in sorted_shift_days:
-        blocked = day_to_blocked_users[day]
-
-        # Available participants (not blocked and haven't exceeded target)
-        available = []
-        for participant in participants:
-            if (participant not in blocked and
-                    assigned_count[participant] < target_shifts[participant]):
-
-                # Check week constraint - not same week
-                week_conflict = False
-                current_week = get_week_number(day)
-                for assigned_day in shifts[participant]:
-                    if get_week_number(assigned_day) == current_week:
-                        week_conflict = True
-                        break
-
-                # Check consecutive days constraint
-                consecutive_conflict = False
-                for assigned_day in shifts[participant]:
-                    if is_consecutive_days(day, assigned_day):
-                        consecutive_conflict = True
-                        break
-
-                if not week_conflict and not consecutive_conflict:
-                    available.append(participant)
-
-        # If no available with new constraints, try without week constraint
-        if not available:
-            for participant in participants:
-                if (participant not in blocked and
-                        assigned_count[participant] < target_shifts[participant]):
-
-                    # Only consecutive days check
-                    consecutive_conflict = False
-                    for assigned_day in shifts[participant]:
-                        if is_consecutive_days(day, assigned_day):
-                            consecutive_conflict = True
-                            break
-
-                    if not consecutive_conflict:
-                        available.append(participant)
-
-        # If still no available, allow one extra shift
-        if not available:
-            for participant in participants:
-                if (participant not in blocked and
-                        assigned_count[participant] < target_shifts[participant] + 1):
-
-                    # Only consecutive days check
-                    consecutive_conflict = False
-                    for assigned_day in shifts[participant]:
-                        if is_consecutive_days(day, assigned_day):
-                            consecutive_conflict = True
-                            break
-
-                    if not consecutive_conflict:
-                        available.append(participant)
-
-        # If still no available, take anyone not blocked and not consecutive
-        if not available:
-            for participant in participants:
-                if participant not in blocked:
-                    consecutive_conflict = False
-                    for assigned_day in shifts[participant]:
-                        if is_consecutive_days(day, assigned_day):
-                            consecutive_conflict = True
-                            break
-
-                    if not consecutive_conflict:
-                        available.append(participant)
+        blocked = day_to_blocked[day]
+        _, current_week, current_ordinal = day_info[day]
+
+        # Score every participant in one pass; lower penalty is a better fit:
+        #   0 - under target, no shift this week, not consecutive
+        #   1 - under target, already has a shift this week
+        #   2 - one shift over target
+        #   3 - more than one shift over target
+        #   4 - consecutive day (extreme case)
+        # Among equal penalties prefer the participant with fewest shifts.
+        best_key = None
+        candidates = []
+        for i in range(num_names):
+            if i in blocked:
+                continue
+
+            count = assigned[i]
+            if (current_ordinal - 1 in ordinals_used[i] or
+                    current_ordinal + 1 in ordinals_used[i]):
+                penalty = 4
+            elif count < target[i]:
+                penalty = 1 if current_week in weeks_used[i] else 0
+            elif count == target[i]:
+                penalty = 2
+            else:
+                penalty = 3
 
-        # If still no available, take anyone not blocked (extreme case)
-        if not available:
-            available = [p for p in participants if p not in blocked]
+            key = (penalty, count)
+            if best_key is None or key < best_key:
+                best_key = key
+                candidates = [i]
+            elif key == best_key:
+                candidates.append(i)
 
-        if not available:
-            shifts["Cannot assign"].append(day)
+        if not candidates:
+            unassigned.append(day)
             continue
 
-        # Choose participant with fewest shifts
-        min_assigned = min(assigned_count[p] for p in available)
-        candidates = [p for p in available if assigned_count[p] == min_assigned]
+        chosen = rng.choice(candidates)
+        shifts_idx[chosen].append(day)
+        assigned[chosen] += 1
+        weeks_used[chosen].add(current_week)
+        ordinals_used[chosen].add(current_ordinal)
+        assignments_in_order.append((current_ordinal, day, chosen))
+
+    shifts = {names[i]: shifts_idx[i] for i in range(num_names)}
 
-        chosen = random.choice(candidates)
-        shifts[chosen].append(day)
-        assigned_count[chosen] += 1
+    # Chronological (day, participant) list, sorted on the integer ordinal
+    assignments_in_order.sort()
+    schedule = [(day, names[i]) for _, day, i in assignments_in_order]
 
-    return shifts, target_shifts, constraint_warnings
+    return shifts, schedule, unassigned, target_shifts, constraint_warnings
 
 
 def display_loaded_config(participants, participant_constraints, users_with_fewer_shifts):
@@ -598,12 +602,11 @@ def display_loaded_config(participants, participant_constraints, users_with_fewe
     print(f"Participants: {', '.join(participants)}")
 
     print("\nConstraints:")
-    weekday_names = {6: 'Sunday', 0: 'Monday', 1: 'Tuesday', 2: 'Wednesday', 3: 'Thursday'}
 
     for name, (weekday_blocks, date_blocks) in participant_constraints.items():
         constraints = []
         if weekday_blocks:
-            weekday_names_list = [weekday_names.get(w, str(w)) for w in weekday_blocks]
+            weekday_names_list = [_WEEKDAY_NAMES[w] if 0 <= w < 7 else str(w) for w in weekday_blocks]
             constraints.append(f"weekdays: {', '.join(weekday_names_list)}")
         if date_blocks:
             constraints.append(f"dates: {', '.join(date_blocks[:3])}{'...' if len(date_blocks) > 3 else ''}")
@@ -690,7 +693,7 @@ def main():
 
     # Generate shift assignments
     print("\n=== Calculating shift assignments... ===")
-    shifts, target_shifts, constraint_warnings = generate_shifts_constraint(
+    shifts, schedule, unassigned, target_shifts, constraint_warnings = generate_shifts_constraint(
         year, month, participants, participant_constraints,
         users_with_fewer_shifts, excluded_days
     )
@@ -706,20 +709,13 @@ def main():
     # Display results
     print(f"\n=== Shift Schedule for {month}/{year} ===")
 
-    # List of shifts sorted by date
-    all_shifts = []
-    for participant, days in shifts.items():
-        for day in days:
-            all_shifts.append((day, participant))
-
-    all_shifts.sort(key=lambda x: x[0])
-
     print("\nShift Schedule:")
     print("-" * 40)
-    for day, participant in all_shifts:
+    for day, participant in schedule:
         try:
-            day_name = datetime.strptime(day, "%Y-%m-%d").strftime("%A")
-            week_num = get_week_number(day)
+            date_obj = parse_iso_date(day)
+            day_name = date_obj.strftime("%A")
+            week_num = date_obj.isocalendar()[1]
             print(f"{day} ({day_name}, week {week_num}): {participant}")
         except:
             print(f"{day}: {participant}")
@@ -730,13 +726,13 @@ def main():
         actual = len(shifts.get(participant, []))
         print(f"{participant}: {actual}")
 
-    total_assigned = sum(len(days) for days in shifts.values() if days != ["Cannot assign"])
+    total_assigned = sum(len(days) for days in shifts.values())
     print(f"\nTotal shifts assigned: {total_assigned}")
 
     # Check for problems
-    if "Cannot assign" in shifts:
+    if unassigned:
         print(f"\n⚠️  Days that could not be assigned:")
-        for day in shifts["Cannot assign"]:
+        for day in unassigned:
             print(f"  - {day}")
 
 